@@ -1,10 +1,13 @@
 
 from __future__ import annotations
 import argparse
+import io
 import os
 import random
-from typing import Optional, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
 
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import chess
 
@@ -37,7 +40,11 @@ COMMON_FONT_PATHS = [
     'C:/Windows/Fonts/arial.ttf',
 ]
 
+# Sprites already resized for a given (sprite_dir, square_size), as RGBA uint8 arrays
+_SPRITE_CACHE: Dict[Tuple[Optional[str], int], Dict[str, np.ndarray]] = {}
 
+
+@lru_cache(maxsize=8)
 def load_font(square_size: int) -> Optional[ImageFont.FreeTypeFont]:
     size = int(square_size * 0.8)
     for p in COMMON_FONT_PATHS:
@@ -60,7 +67,7 @@ def is_legal_fen(fen: str) -> bool:
         return False
 
 
-def random_legal_fen(max_plies: int = 80, seed: Optional[int] = None) -> str:
+def random_legal_board(max_plies: int = 80, seed: Optional[int] = None) -> chess.Board:
     if seed is not None:
         random.seed(seed)
     board = chess.Board()
@@ -71,9 +78,16 @@ def random_legal_fen(max_plies: int = 80, seed: Optional[int] = None) -> str:
             break
         move = random.choice(moves)
         board.push(move)
-        if board.is_game_over():
+        # Mate/stalemate shows up as an empty move list on the next ply, so
+        # only the draw rules need checking here (is_game_over() would
+        # generate the legal moves a second time).
+        if board.is_insufficient_material() or board.is_seventyfive_moves() or board.is_fivefold_repetition():
             break
-    return board.fen()
+    return board
+
+
+def random_legal_fen(max_plies: int = 80, seed: Optional[int] = None) -> str:
+    return random_legal_board(max_plies, seed).fen()
 
 
 def algebraic_to_xy(file_idx: int, rank_idx: int, flipped: bool) -> Tuple[int, int]:
@@ -110,6 +124,7 @@ def draw_coordinates(draw: ImageDraw.ImageDraw, img_w: int, img_h: int, sq: int,
         draw.text((x, y - h / 2), r, fill=COORD, font=font)
 
 
+@lru_cache(maxsize=8)
 def load_sprites(sprite_dir: Optional[str]) -> dict:
     sprites = {}
     if not sprite_dir:
@@ -124,19 +139,39 @@ def load_sprites(sprite_dir: Optional[str]) -> dict:
     return sprites
 
 
-def render_position(
-    fen: str,
-    out_path: str = 'board.png',
-    square_size: int = 96,
-    margin: int = 32,
-    flipped: bool = False,
-    show_coordinates: bool = True,
-    sprite_dir: Optional[str] = None,
-) -> str:
-    if not is_legal_fen(fen):
-        raise ValueError("Provided FEN is not a legal position.")
+def load_sized_sprites(sprite_dir: Optional[str], square_size: int) -> dict:
+    key = (sprite_dir, square_size)
+    sized = _SPRITE_CACHE.get(key)
+    if sized is None:
+        size = int(square_size * 0.92)
+        sized = {sym: np.asarray(sprite.resize((size, size), Image.LANCZOS))
+                 for sym, sprite in load_sprites(sprite_dir).items()}
+        _SPRITE_CACHE[key] = sized
+    return sized
+
+
+def save_image(img: Image.Image, out, fmt: Optional[str] = None) -> None:
+    fmt = (fmt or os.path.splitext(out)[1]).lower().lstrip('.')
+    if fmt in ('jpg', 'jpeg'):
+        img.convert('RGB').save(out, format='JPEG', quality=90, subsampling=1)
+    elif fmt == 'webp':
+        img.save(out, format='WEBP', method=4, quality=90)
+    elif fmt == 'png':
+        # zlib level 1: much faster to encode, only slightly larger files
+        img.save(out, format='PNG', compress_level=1, optimize=False)
+    else:
+        # Let Pillow pick (or reject) the format from the extension
+        img.save(out)
+
 
-    board = chess.Board(fen)
+def encode_image(img: Image.Image, fmt: str = 'png') -> bytes:
+    buf = io.BytesIO()
+    save_image(img, buf, fmt)
+    return buf.getvalue()
+
+
+@lru_cache(maxsize=8)
+def _board_template(square_size: int, margin: int, flipped: bool, show_coordinates: bool) -> Image.Image:
     board_px = square_size * 8
     img_w = board_px + margin * 2
     img_h = board_px + margin * 2
@@ -158,13 +193,63 @@ def render_position(
     if show_coordinates:
         draw_coordinates(draw, img_w, img_h, square_size, margin, flipped)
 
-    sprites = load_sprites(sprite_dir)
-    font = load_font(square_size)
+    return img
 
-    for sq in chess.SQUARES:
-        piece = board.piece_at(sq)
-        if not piece:
-            continue
+
+def render_position(
+    fen: str,
+    out_path: str = 'board.png',
+    square_size: int = 96,
+    margin: int = 32,
+    flipped: bool = False,
+    show_coordinates: bool = True,
+    sprite_dir: Optional[str] = None,
+    validate: bool = True,
+) -> str:
+    # validate=False skips the is_valid() pass for FENs already known to be
+    # legal, e.g. ones produced by random_legal_fen()
+    if validate and not is_legal_fen(fen):
+        raise ValueError("Provided FEN is not a legal position.")
+
+    return render_position_board(
+        chess.Board(fen),
+        out_path=out_path,
+        square_size=square_size,
+        margin=margin,
+        flipped=flipped,
+        show_coordinates=show_coordinates,
+        sprite_dir=sprite_dir,
+    )
+
+
+def render_position_board(
+    board: chess.Board,
+    out_path: str = 'board.png',
+    square_size: int = 96,
+    margin: int = 32,
+    flipped: bool = False,
+    show_coordinates: bool = True,
+    sprite_dir: Optional[str] = None,
+) -> str:
+    img = render_board_image(board, square_size, margin, flipped, show_coordinates, sprite_dir)
+    save_image(img, out_path)
+    return out_path
+
+
+def render_board_image(
+    board: chess.Board,
+    square_size: int = 96,
+    margin: int = 32,
+    flipped: bool = False,
+    show_coordinates: bool = True,
+    sprite_dir: Optional[str] = None,
+) -> Image.Image:
+    base = np.array(_board_template(square_size, margin, flipped, show_coordinates))
+
+    sprites = load_sized_sprites(sprite_dir, square_size)
+    glyphs = []
+
+    for sq, piece in board.piece_map().items():
         file_idx = chess.square_file(sq)
         rank_idx = chess.square_rank(sq)
         x, y = algebraic_to_xy(file_idx, rank_idx, flipped)
@@ -177,21 +262,91 @@ def render_position(
 
         if sym in sprites:
             sprite = sprites[sym]
-            sprite_resized = sprite.resize((int(square_size*0.92), int(square_size*0.92)), Image.LANCZOS)
-            px = cx - sprite_resized.width // 2
-            py = cy - sprite_resized.height // 2
-            img.alpha_composite(sprite_resized, (px, py))
+            h, w = sprite.shape[:2]
+            px = cx - w // 2
+            py = cy - h // 2
+            dst = base[py:py + h, px:px + w, :3]
+            a = sprite[..., 3:4].astype(np.float32) / 255
+            dst[...] = (sprite[..., :3] * a + dst * (1 - a) + 0.5).astype(np.uint8)
         else:
-            glyph = UNICODE_MAP[sym]
-            if font is None:
-                raise RuntimeError("No suitable font found for Unicode glyphs and no sprites provided.")
-            bbox = font.getbbox(glyph)
-            w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-            draw.text((cx - w/2 + 1, cy - h/2 + 1), glyph, font=font, fill=(0,0,0,140))
-            draw.text((cx - w/2, cy - h/2), glyph, font=font, fill=(20,20,20) if sym.islower() else (250,250,250))
-
-    img.save(out_path)
-    return out_path
+            glyphs.append((sym, cx, cy))
+
+    img = Image.fromarray(base)
+
+    if glyphs:
+        _draw_glyphs(img, glyphs, square_size)
+
+    return img
+
+
+def _draw_glyphs(img: Image.Image, glyphs: list, square_size: int) -> None:
+    font = load_font(square_size)
+    if font is None:
+        raise RuntimeError("No suitable font found for Unicode glyphs and no sprites provided.")
+    draw = ImageDraw.Draw(img)
+    for sym, cx, cy in glyphs:
+        glyph = UNICODE_MAP[sym]
+        bbox = font.getbbox(glyph)
+        w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        draw.text((cx - w/2 + 1, cy - h/2 + 1), glyph, font=font, fill=(0,0,0,140))
+        draw.text((cx - w/2, cy - h/2), glyph, font=font, fill=(20,20,20) if sym.islower() else (250,250,250))
+
+
+def make_renderer(
+    square_size: int,
+    margin: int = 0,
+    flipped: bool = False,
+    sprite_dir: Optional[str] = None,
+    show_coordinates: bool = False,
+    fmt: str = 'png',
+) -> Callable[[chess.Board], bytes]:
+    """Return a render(board) -> encoded image bytes function specialized for
+    fixed board settings, for rendering many positions in a row.
+
+    Requires a complete sprite set; there is no Unicode glyph fallback."""
+    sized = load_sized_sprites(sprite_dir, square_size)
+    missing = [fname for sym, fname in SPRITE_FILENAMES.items() if sym not in sized]
+    if missing:
+        raise ValueError(f"Sprite dir {sprite_dir!r} is missing pieces: {', '.join(missing)}")
+
+    base_rgba = np.array(_board_template(square_size, margin, flipped, show_coordinates))
+
+    # Blend terms precomputed per sprite: colour * alpha, and (1 - alpha),
+    # ordered white P N B R Q K then black to match the masks in render()
+    sprites = []
+    for sym in 'PNBRQKpnbrqk':
+        a = sized[sym][..., 3:4].astype(np.float32) / 255
+        sprites.append((sized[sym][..., :3] * a, 1 - a))
+
+    # All sprites share one size, so each square's sprite position is fixed:
+    # precompute the (y0, y1, x0, x1) paste box, indexed by chess square.
+    size = int(square_size * 0.92)
+    offset = square_size // 2 - size // 2
+    boxes = []
+    for sq in chess.SQUARES:
+        x, y = algebraic_to_xy(chess.square_file(sq), chess.square_rank(sq), flipped)
+        px = margin + x * square_size + offset
+        py = margin + y * square_size + offset
+        boxes.append((py, py + size, px, px + size))
+
+    def render(board: chess.Board) -> bytes:
+        buf = base_rgba.copy()
+        # Read the piece bitboards directly rather than building Piece
+        # objects through piece_map()
+        w = board.occupied_co[chess.WHITE]
+        b = board.occupied_co[chess.BLACK]
+        masks = (board.pawns & w, board.knights & w, board.bishops & w,
+                 board.rooks & w, board.queens & w, board.kings & w,
+                 board.pawns & b, board.knights & b, board.bishops & b,
+                 board.rooks & b, board.queens & b, board.kings & b)
+        for (src, inv_a), mask in zip(sprites, masks):
+            for sq in chess.scan_forward(mask):
+                y0, y1, x0, x1 = boxes[sq]
+                dst = buf[y0:y1, x0:x1, :3]
+                dst[...] = (src + dst * inv_a + 0.5).astype(np.uint8)
+        return encode_image(Image.fromarray(buf), fmt)
+
+    return render
 
 
 def main():
@@ -200,7 +355,7 @@ def main():
     group.add_argument('--fen', type=str, help='FEN string of the position to render')
     group.add_argument('--random', type=int, metavar='MAX_PLIES', help='Generate a random legal position with up to MAX_PLIES half-moves')
 
-    parser.add_argument('--out', type=str, default='board.png', help='Output PNG path')
+    parser.add_argument('--out', type=str, default='board.png', help='Output image path (.png, .jpg or .webp)')
     parser.add_argument('--sq', type=int, default=96, help='Square size in pixels (default: 96)')
     parser.add_argument('--margin', type=int, default=32, help='Margin in pixels (default: 32)')
     parser.add_argument('--flip', action='store_true', help='Flip board to view from black side')
@@ -1,13 +1,69 @@
-import os, csv, argparse
+import os, io, csv, argparse, random, tarfile, time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
-import chess
-from chess_image_gen import render_position, random_legal_fen
+from chess_image_gen import make_renderer, random_legal_board
 
-def generate_dataset(n, out_dir, sq=256, sprites=None):
-    os.makedirs(os.path.join(out_dir, "images"), exist_ok=True)
+# Sprite pack shipped with the repo, found regardless of the working directory
+DEFAULT_SPRITES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pieces")
+
+# Per-worker settings, filled in by _init_worker
+_WORKER = {}
+
+def _init_worker(sq, sprites, fmt):
+    # Forked workers inherit the parent's RNG state; reseed so they don't
+    # all play out the same games.
+    random.seed()
+    _WORKER.update(fmt=fmt, render=make_renderer(sq, sprite_dir=sprites, fmt=fmt))
+
+def _gen_one(i):
+    board = random_legal_board()
+    img_file = f"{i:06d}.{_WORKER['fmt']}"
+
+    img_bytes = _WORKER["render"](board)
+
+    return img_bytes, [
+        img_file,
+        board.fen(),
+        board.turn,                 # True = White, False = Black
+        board.fullmove_number,      # Fullmove counter
+        board.castling_xfen(),      # Castling rights
+        board.ep_square if board.ep_square else "-",  # En passant square
+        board.is_check(),
+        board.is_game_over()
+    ]
+
+def _write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def _add_to_tar(tar_out, name, data):
+    info = tarfile.TarInfo(name=name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar_out.addfile(info, io.BytesIO(data))
+
+def generate_dataset(n, out_dir, sq=256, sprites=DEFAULT_SPRITES, workers=None, fmt="jpg", tar=False):
+    # Build one renderer up front so a bad sprite dir or size fails here,
+    # once; an exception in the Pool initializer would respawn workers forever.
+    make_renderer(sq, sprite_dir=sprites, fmt=fmt)
+
+    img_dir = os.path.join(out_dir, "images")
+    os.makedirs(out_dir if tar else img_dir, exist_ok=True)
     meta_path = os.path.join(out_dir, "metadata.csv")
 
-    with open(meta_path, "w", newline="") as f:
+    # In tar mode images are streamed into one archive instead of N files
+    tar_out = tarfile.open(os.path.join(out_dir, "dataset.tar"), "w|", bufsize=1 << 20) if tar else None
+    try:
+        _generate(n, meta_path, img_dir, tar_out, sq, sprites, workers, fmt)
+        if tar_out is not None:
+            tar_out.add(meta_path, arcname="metadata.csv")
+    finally:
+        if tar_out is not None:
+            tar_out.close()
+
+def _generate(n, meta_path, img_dir, tar_out, sq, sprites, workers, fmt):
+    with open(meta_path, "w", newline="", buffering=1 << 20) as f:
         writer = csv.writer(f)
         writer.writerow([
             "id", "fen", "turn", "move_number",
@@ -15,39 +71,45 @@ def generate_dataset(n, out_dir, sq=256, sprites=None):
             "is_check", "is_game_over"
         ])
 
-        for i in tqdm(range(1, n+1)):
-            fen = random_legal_fen()
-            img_file = f"{i:06d}.png"
-
-            render_position(
-                fen=fen,
-                out_path=os.path.join(out_dir, "images", img_file),
-                square_size=sq,
-                margin=0,
-                flipped=False,
-                show_coordinates=False,
-                sprite_dir=sprites
-            )
-
-            board = chess.Board(fen)
-
-            writer.writerow([
-                img_file,
-                fen,
-                board.turn,                 # True = White, False = Black
-                board.fullmove_number,      # Fullmove counter
-                board.castling_xfen(),      # Castling rights
-                board.ep_square if board.ep_square else "-",  # En passant square
-                board.is_check(),
-                board.is_game_over()
-            ])
+        # Workers render and encode; image files are written from a thread
+        # pool here so disk I/O overlaps with rendering the next samples.
+        with multiprocessing.Pool(workers or os.cpu_count(), initializer=_init_worker,
+                                  initargs=(sq, sprites, fmt)) as pool, \
+                ThreadPoolExecutor(max_workers=4) as io_pool:
+            # imap (not imap_unordered) keeps metadata.csv in id order
+            batch, pending = [], []
+            for img_bytes, row in tqdm(pool.imap(_gen_one, range(1, n+1), chunksize=32), total=n):
+                if tar_out is not None:
+                    _add_to_tar(tar_out, f"images/{row[0]}", img_bytes)
+                else:
+                    pending.append(io_pool.submit(_write_file, os.path.join(img_dir, row[0]), img_bytes))
+                batch.append(row)
+                if len(batch) >= 1024:
+                    writer.writerows(batch)
+                    batch.clear()
+                    # Surface write errors and keep the write queue bounded
+                    for fut in pending:
+                        fut.result()
+                    pending.clear()
+            writer.writerows(batch)
+            for fut in pending:
+                fut.result()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--n", type=int, required=True, help="Number of samples")
     parser.add_argument("--out", type=str, required=True, help="Output directory")
     parser.add_argument("--sq", type=int, default=256, help="Image size (square)")
-    parser.add_argument("--sprites", type=str, default="pieces", help="Sprite dir")
+    parser.add_argument("--target-size", type=int, default=None, help="Final image size in px; overrides --sq with target_size // 8")
+    parser.add_argument("--sprites", type=str, default=DEFAULT_SPRITES, help="Sprite dir (default: the bundled pieces/)")
+    parser.add_argument("--fmt", type=str, default="jpg", choices=["jpg", "webp", "png"], help="Image format")
+    parser.add_argument("--tar", action="store_true", help="Write images and metadata.csv into OUT/dataset.tar")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
     args = parser.parse_args()
 
-    generate_dataset(args.n, args.out, args.sq, args.sprites)
+    if args.target_size is not None and (args.target_size < 16 or args.target_size % 8):
+        parser.error("--target-size must be a multiple of 8 and at least 16")
+    sq = args.target_size // 8 if args.target_size is not None else args.sq
+    if sq < 2:
+        parser.error("--sq must be at least 2")
+    generate_dataset(args.n, args.out, sq, args.sprites, args.workers, args.fmt, args.tar)
@@ -1,19 +1,23 @@
 import csv
 import chess
+from concurrent.futures import ProcessPoolExecutor
 
-def validate_metadata(meta_file, warnings_file="warnings.txt"):
-    invalid_rows = []
+def _check(row):
+    rid, fen = row
+    try:
+        board = chess.Board(fen)
+        if not board.is_valid():
+            return (rid, fen, "Invalid board state")
+    except Exception as e:
+        return (rid, fen, f"Error: {str(e)}")
+    return None
 
+def validate_metadata(meta_file, warnings_file="warnings.txt"):
     with open(meta_file, "r") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            fen = row["fen"]
-            try:
-                board = chess.Board(fen)
-                if not board.is_valid():
-                    invalid_rows.append((row["id"], fen, "Invalid board state"))
-            except Exception as e:
-                invalid_rows.append((row["id"], fen, f"Error: {str(e)}"))
+        rows = [(row["id"], row["fen"]) for row in csv.DictReader(f)]
+
+    with ProcessPoolExecutor() as ex:
+        invalid_rows = [r for r in ex.map(_check, rows, chunksize=512) if r is not None]
 
     # Write warnings to file
     if invalid_rows: